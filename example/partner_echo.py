@@ -0,0 +1,72 @@
+"""
+Example of a passive partner that sends every packet it receives back to the
+active partner.
+
+The received packets are picked up with poll_recv, which busy-polls for a
+short while before it starts sleeping. This keeps the round trip time low at
+the cost of some CPU time while packets are coming in.
+
+Receiving and sending are done in separate threads, connected by a queue with
+a single producer and a single consumer. This way the next packet can be
+received while the previous one is still being sent back.
+
+A partner that doesn't need to look at the packets can instead call
+partner.echo_once() in a loop, which sends a received packet back straight
+from the receive buffer of the partner. It leaves a packet on the receive side
+until the previous send is done, so no packets are lost.
+"""
+import logging
+import queue
+import threading
+
+import snap7.partner
+from snap7.exceptions import Snap7Exception
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# the maximum number of packets waiting to be sent back
+queue_size = 64
+
+partner = snap7.partner.Partner(active=False)
+partner.start_to('0.0.0.0', '192.168.0.41', 0x1002, 0x1002)
+
+packets: "queue.Queue" = queue.Queue(maxsize=queue_size)
+
+
+def send_loop():
+    while True:
+        packet = packets.get()
+        if packet is None:
+            break
+        r_id, data = packet
+        logger.debug(f"echoing {len(data)} bytes with r_id {r_id}")
+        try:
+            partner.as_b_send(data, r_id)
+            partner.wait_as_b_send_completion(timeout=1000)
+        except Snap7Exception as e:
+            logger.error(f"failed to echo packet with r_id {r_id}: {e!r}")
+
+
+sender = threading.Thread(target=send_loop)
+sender.start()
+
+try:
+    # stop receiving if the sender died, nothing would take the packets from
+    # the queue anymore
+    while sender.is_alive():
+        # the packets wait in the queue while new ones are received, so they
+        # have to be copied out of the receive buffer
+        received = partner.poll_recv(timeout=1000)
+        while received is not None and sender.is_alive():
+            try:
+                packets.put(received, timeout=1)
+                break
+            except queue.Full:
+                pass
+finally:
+    if sender.is_alive():
+        packets.put(None)
+        sender.join()
+    partner.stop()
+    partner.destroy()
@@ -7,13 +7,18 @@ it, the peer to peer model sees two components with same rights, each of them
 can send data asynchronously. The only difference between them is the one who
 is requesting the connection.
 """
-from ctypes import c_int32, c_uint32, byref, c_uint16, c_int, c_void_p
+from ctypes import c_int32, c_uint32, byref, c_uint16, c_int, c_void_p, c_ubyte, c_char_p, POINTER, CFUNCTYPE, string_at
+import functools
 import logging
-import re
-from typing import Tuple, Optional
+import os
+import socket
+import time
+import weakref
+from typing import Tuple, Optional, Callable, Any, Union
 
 import snap7.types
-from snap7.common import load_library, check_error, ipv4
+from snap7.types import buffer_size, buffer_type
+from snap7.common import load_library, check_error
 from snap7.exceptions import Snap7Exception
 
 logger = logging.getLogger(__name__)
@@ -24,53 +29,268 @@ def error_wrap(func):
 
     def f(*args, **kw):
         code = func(*args, **kw)
-        check_error(code, context="partner")
+        if code:
+            check_error(code, context="partner")
+        return code
 
     return f
 
 
+# os.sched_yield is not available on all platforms
+_sched_yield = getattr(os, "sched_yield", functools.partial(time.sleep, 0))
+
+
+def _valid_ip(ip: str) -> bool:
+    """Checks if the given address is a valid dotted quad ipv4 address."""
+    try:
+        socket.inet_pton(socket.AF_INET, ip)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+# prototypes of the recv and send callbacks
+recv_callback_type = CFUNCTYPE(None, c_void_p, c_int32, snap7.types.longword, c_void_p, c_int32)
+send_callback_type = CFUNCTYPE(None, c_void_p, c_int32)
+
+# libraries of which the Par_* prototypes have already been declared
+_declared_libraries: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+
+def _declare_prototypes(library) -> None:
+    """Declares the argument and return types of the Par_* functions.
+
+    With declared prototypes ctypes converts the arguments directly instead of
+    guessing their types on every call. This is done only once per library.
+    """
+    if library in _declared_libraries:
+        return
+
+    S7Object = snap7.types.S7Object
+    longword = snap7.types.longword
+    word = snap7.types.word
+    prototypes = {
+        "Par_AsBSend": [S7Object, longword, c_void_p, c_int32],
+        "Par_BRecv": [S7Object, POINTER(longword), c_void_p, POINTER(c_int32), longword],
+        "Par_BSend": [S7Object, longword, c_void_p, c_int32],
+        "Par_CheckAsBRecvCompletion": [S7Object, POINTER(c_int32), POINTER(longword), c_void_p, POINTER(c_int32)],
+        "Par_CheckAsBSendCompletion": [S7Object, POINTER(c_int32)],
+        "Par_Destroy": [POINTER(S7Object)],
+        "Par_GetLastError": [S7Object, POINTER(c_int32)],
+        "Par_GetParam": [S7Object, c_int, c_void_p],
+        "Par_GetStats": [S7Object, POINTER(longword), POINTER(longword), POINTER(longword), POINTER(longword)],
+        "Par_GetStatus": [S7Object, POINTER(c_int32)],
+        "Par_GetTimes": [S7Object, POINTER(longword), POINTER(longword)],
+        "Par_SetParam": [S7Object, c_int, c_void_p],
+        "Par_SetRecvCallback": [S7Object, recv_callback_type, c_void_p],
+        "Par_SetSendCallback": [S7Object, send_callback_type, c_void_p],
+        "Par_Start": [S7Object],
+        "Par_StartTo": [S7Object, c_char_p, c_char_p, word, word],
+        "Par_Stop": [S7Object],
+        "Par_WaitAsBSendCompletion": [S7Object, longword],
+    }
+    for name, argtypes in prototypes.items():
+        function = getattr(library, name)
+        function.argtypes = argtypes
+        function.restype = c_int32
+
+    library.Par_Create.argtypes = [c_int]
+    library.Par_Create.restype = S7Object
+    _declared_libraries.add(library)
+
+
 class Partner:
     """
     A snap7 partner.
+
+    The receive functions reuse the same ctypes out parameters for every call,
+    so a partner should not receive from more than one thread at a time.
     """
+    __slots__ = (
+        "_library", "_pointer",
+        "_par_as_b_send", "_par_b_send", "_par_b_recv", "_par_check_as_b_recv_completion",
+        "_par_check_as_b_send_completion",
+        "_send_buffer", "_send_buffer_c", "_recv_buffer", "_recv_buffer_c", "_recv_view",
+        "_recv_callback", "_send_callback",
+        "_scratch_op_result", "_scratch_r_id", "_scratch_size",
+        "__weakref__",
+    )
     _pointer: Optional[c_void_p]
 
     def __init__(self, active: bool = False):
         self._library = load_library()
+        _declare_prototypes(self._library)
+        # the functions called for every packet, looked up only once
+        self._par_as_b_send = self._library.Par_AsBSend
+        self._par_b_send = self._library.Par_BSend
+        self._par_b_recv = self._library.Par_BRecv
+        self._par_check_as_b_recv_completion = self._library.Par_CheckAsBRecvCompletion
+        self._par_check_as_b_send_completion = self._library.Par_CheckAsBSendCompletion
         self._pointer = None
+        self._send_buffer = bytearray(buffer_size)
+        self._send_buffer_c = buffer_type.from_buffer(self._send_buffer)
+        self._recv_buffer = bytearray(buffer_size)
+        self._recv_buffer_c = buffer_type.from_buffer(self._recv_buffer)
+        self._recv_view = memoryview(self._recv_buffer)
+        self._recv_callback: Optional[Any] = None
+        self._send_callback: Optional[Any] = None
+        # out parameters of the receive functions
+        self._scratch_op_result = c_int32()
+        self._scratch_r_id = snap7.types.longword()
+        self._scratch_size = c_int32()
         self.create(active)
 
     def __del__(self):
         self.destroy()
 
-    def as_b_send(self) -> int:
+    def _send_data(self, data: Union[bytes, bytearray, memoryview]) -> Tuple[Any, int]:
+        """Returns the data in a form that can be passed to snap7 as a pointer,
+        together with its size in bytes.
+
+        Snap7 copies the data into its own send buffer before a send function
+        returns, so bytes and bytearrays are passed without copying them. Other
+        buffers are copied into the send buffer of the partner.
+        """
+        view = memoryview(data)
+        if not view.c_contiguous:
+            data = view.tobytes()
+            view = memoryview(data)
+        size = view.nbytes
+        if size >= buffer_size:
+            raise ValueError(f"data size ({size}) must be smaller than the buffer size ({buffer_size})")
+        if isinstance(data, bytearray):
+            return (c_ubyte * size).from_buffer(data), size
+        if isinstance(data, bytes):
+            return data, size
+        self._send_buffer[:size] = view.cast("B")
+        return self._send_buffer_c, size
+
+    @error_wrap
+    def as_b_send(self, data: Union[bytes, bytearray, memoryview], r_id: int = 0) -> int:
         """
         Sends a data packet to the partner. This function is asynchronous, i.e.
         it terminates immediately, a completion method is needed to know when
         the transfer is complete.
+
+        :param data: the packet to send
+        :param r_id: routing parameter, must match the one of the receiver
         """
-        return self._library.Par_AsBSend(self._pointer)
+        pointer, size = self._send_data(data)
+        return self._par_as_b_send(self._pointer, r_id, pointer, size)
 
-    def b_recv(self) -> int:
+    def b_recv(self, timeout: int = 3000, copy: bool = True) -> Tuple[int, Union[bytearray, memoryview]]:
         """
         Receives a data packet from the partner. This function is
         synchronous, it waits until a packet is received or the timeout
         supplied expires.
-        """
-        return self._library.Par_BRecv(self._pointer)
 
-    def b_send(self) -> int:
+        :param timeout: timeout in milliseconds
+        :param copy: if False, the data is returned as a memoryview on the
+            receive buffer of the partner, which is only valid until the next
+            packet is received
+        :returns: a tuple containing the routing id and the received data
+        """
+        r_id, size = self.b_recv_into(self._recv_buffer, timeout)
+        if copy:
+            return r_id, self._recv_buffer[0:size]
+        return r_id, self._recv_view[0:size]
+
+    def b_recv_into(self, out: bytearray, timeout: int = 3000) -> Tuple[int, int]:
+        """
+        Receives a data packet from the partner into the given buffer, without
+        creating any new Python object for the data. Like b_recv, this function
+        is synchronous.
+
+        :param out: the buffer to receive the data in, snap7 doesn't know its
+            size so it must be able to hold the largest possible packet
+        :param timeout: timeout in milliseconds
+        :returns: a tuple containing the routing id and the number of bytes
+            received
+        """
+        if out is self._recv_buffer:
+            buffer = self._recv_buffer_c
+        elif len(out) < buffer_size:
+            raise ValueError(f"buffer size ({len(out)}) is smaller than {buffer_size}")
+        else:
+            buffer = (c_ubyte * len(out)).from_buffer(out)
+        r_id = self._scratch_r_id
+        size = self._scratch_size
+        code = self._par_b_recv(self._pointer, byref(r_id), buffer, byref(size), timeout)
+        if code:
+            check_error(code, context="partner")
+        return r_id.value, size.value
+
+    @error_wrap
+    def b_send(self, data: Union[bytes, bytearray, memoryview], r_id: int = 0) -> int:
         """
         Sends a data packet to the partner. This function is synchronous, i.e.
         it terminates when the transfer job (send+ack) is complete.
+
+        :param data: the packet to send
+        :param r_id: routing parameter, must match the one of the receiver
         """
-        return self._library.Par_BSend(self._pointer)
+        pointer, size = self._send_data(data)
+        return self._par_b_send(self._pointer, r_id, pointer, size)
 
-    def check_as_b_recv_completion(self) -> int:
+    def check_as_b_recv_completion(self, copy: bool = True) -> Optional[Tuple[int, Union[bytearray, memoryview]]]:
         """
         Checks if a packed received was received.
+
+        :param copy: if False, the data is returned as a memoryview on the
+            receive buffer of the partner, which is only valid until the next
+            packet is received
+        :returns: a tuple containing the routing id and the received data, or
+            None if no packet was received
+        """
+        if not self._recv_completed():
+            return None
+        size = self._scratch_size.value
+        if copy:
+            return self._scratch_r_id.value, self._recv_buffer[0:size]
+        return self._scratch_r_id.value, self._recv_view[0:size]
+
+    def _recv_completed(self) -> bool:
+        """Checks if a packet was received into the receive buffer, the routing
+        id and size are left in the scratch out parameters."""
+        op_result = self._scratch_op_result
+        result = self._par_check_as_b_recv_completion(self._pointer, byref(op_result), byref(self._scratch_r_id),
+                                                      self._recv_buffer_c, byref(self._scratch_size))
+        # 0: job complete, 1: job pending, -2: invalid handle
+        if result == -2:
+            raise Snap7Exception("The Partner parameter was invalid")
+        if result != 0:
+            return False
+        if op_result.value:
+            check_error(op_result.value, context="partner")
+        return True
+
+    def echo_once(self) -> Optional[Tuple[int, int]]:
         """
-        return self._library.Par_CheckAsBRecvCompletion(self._pointer)
+        Checks if a packet was received and if so, sends it back to the
+        partner straight from the receive buffer, without creating any Python
+        object for the data. Like as_b_send, the send is asynchronous.
+
+        As long as the previous asynchronous send is in progress, no packet is
+        taken from the receive side, so it can be called in a loop without
+        losing packets. The result of the previous send is not checked.
+
+        :returns: a tuple containing the routing id and the size of the echoed
+            packet, or None if no packet was received or the previous send is
+            still in progress
+        """
+        result = self._par_check_as_b_send_completion(self._pointer, byref(self._scratch_op_result))
+        if result == -2:
+            raise Snap7Exception("The Partner parameter was invalid")
+        if result != 0:
+            return None
+        if not self._recv_completed():
+            return None
+        r_id = self._scratch_r_id.value
+        size = self._scratch_size.value
+        code = self._par_as_b_send(self._pointer, r_id, self._recv_buffer_c, size)
+        if code:
+            check_error(code, context="partner")
+        return r_id, size
 
     def check_as_b_send_completion(self) -> Tuple[str, c_int32]:
         """
@@ -90,6 +310,35 @@ class Partner:
 
         return return_values[result], op_result
 
+    def poll_recv(self, timeout: int = 3000, copy: bool = True) -> Optional[Tuple[int, Union[bytearray, memoryview]]]:
+        """
+        Waits for an asynchronously received packet by polling
+        check_as_b_recv_completion. The poll loop first spins, then yields the
+        processor and finally sleeps a millisecond between polls, which keeps
+        the latency low without occupying a core while the partner is idle.
+
+        :param timeout: timeout in milliseconds
+        :param copy: if False, the data is returned as a memoryview on the
+            receive buffer, see check_as_b_recv_completion
+        :returns: a tuple containing the routing id and the received data, or
+            None if no packet was received before the timeout expired
+        """
+        deadline = time.monotonic() + timeout / 1000
+        spins = 0
+        while True:
+            received = self.check_as_b_recv_completion(copy=copy)
+            if received is not None:
+                return received
+            if time.monotonic() >= deadline:
+                return None
+            if spins < 1000:
+                spins += 1
+            elif spins < 2000:
+                _sched_yield()
+                spins += 1
+            else:
+                time.sleep(0.001)
+
     def create(self, active: bool = False):
         """
         Creates a Partner and returns its handle, which is the reference that
@@ -98,17 +347,21 @@ class Partner:
         :param active: 0
         :returns: a pointer to the partner object
         """
-        self._library.Par_Create.restype = snap7.types.S7Object
         self._pointer = snap7.types.S7Object(self._library.Par_Create(int(active)))
 
-    def destroy(self):
+    def destroy(self) -> Optional[int]:
         """
         Destroy a Partner of given handle.
         Before destruction the Partner is stopped, all clients disconnected and
-        all shared memory blocks released.
-        """
-        if self._library:
-            return self._library.Par_Destroy(byref(self._pointer))
+        all shared memory blocks released. Destroying a Partner a second time
+        does nothing.
+        """
+        # the slots are unset if __init__ failed, e.g. when loading the library
+        library = getattr(self, "_library", None)
+        pointer = getattr(self, "_pointer", None)
+        if library is not None and pointer is not None:
+            self._pointer = None
+            return library.Par_Destroy(byref(pointer))
         return None
 
     def get_last_error(self) -> c_int32:
@@ -158,12 +411,12 @@ class Partner:
         check_error(result, "partner")
         return status
 
-    def get_times(self) -> Tuple[c_int32, c_int32]:
+    def get_times(self) -> Tuple[c_uint32, c_uint32]:
         """
         Returns the last send and recv jobs execution time in milliseconds.
         """
-        send_time = c_int32()
-        recv_time = c_int32()
+        send_time = c_uint32()
+        recv_time = c_uint32()
         result = self._library.Par_GetTimes(self._pointer, byref(send_time), byref(recv_time))
         check_error(result, "partner")
         return send_time, recv_time
@@ -176,19 +429,50 @@ class Partner:
         return self._library.Par_SetParam(self._pointer, number,
                                           byref(c_int(value)))
 
-    def set_recv_callback(self) -> int:
+    @error_wrap
+    def set_recv_callback(self, callback: Callable[[int, int, Union[bytes, memoryview, None]], Any],
+                          zero_copy: bool = False) -> int:
         """
         Sets the user callback that the Partner object has to call when a data
         packet is incoming.
+
+        :param callback: a function accepting the operation result, the
+            routing id and the received data (None if the operation failed)
+        :param zero_copy: if True, the data is passed as a memoryview on the
+            snap7 buffer instead of as bytes. The memoryview is only valid
+            during the callback, snap7 reuses the buffer afterwards.
         """
-        return self._library.Par_SetRecvCallback(self._pointer)
+        logger.info("setting recv callback")
+
+        def wrapper(usrptr: Optional[c_void_p], op_result: int, r_id: int, data_pointer: int, size: int) -> None:
+            data: Union[bytes, memoryview, None]
+            if op_result != 0:
+                data = None
+            elif zero_copy:
+                # snap7 may pass a NULL pointer for an empty packet
+                data = memoryview((c_ubyte * size).from_address(data_pointer)) if size else memoryview(b"")
+            else:
+                data = string_at(data_pointer, size)
+            callback(op_result, r_id, data)
+
+        self._recv_callback = recv_callback_type(wrapper)
+        return self._library.Par_SetRecvCallback(self._pointer, self._recv_callback, None)
 
-    def set_send_callback(self) -> int:
+    @error_wrap
+    def set_send_callback(self, callback: Callable[[int], Any]) -> int:
         """
         Sets the user callback that the Partner object has to call when the
         asynchronous data sent is complete.
+
+        :param callback: a function accepting the operation result
         """
-        return self._library.Par_SetSendCallback(self._pointer)
+        logger.info("setting send callback")
+
+        def wrapper(usrptr: Optional[c_void_p], op_result: int) -> None:
+            callback(op_result)
+
+        self._send_callback = send_callback_type(wrapper)
+        return self._library.Par_SetSendCallback(self._pointer, self._send_callback, None)
 
     @error_wrap
     def start(self) -> int:
@@ -210,14 +494,13 @@ class Partner:
         :param remote_tsap: PLC TSAP
         """
 
-        if not re.match(ipv4, local_ip):
+        if not _valid_ip(local_ip):
             raise ValueError(f"{local_ip} is invalid ipv4")
-        if not re.match(ipv4, remote_ip):
+        if not _valid_ip(remote_ip):
             raise ValueError(f"{remote_ip} is invalid ipv4")
         logger.info(f"starting partnering from {local_ip} to {remote_ip}")
-        return self._library.Par_StartTo(self._pointer, local_ip.encode(), remote_ip.encode(),
-                                         snap7.types.word(local_tsap),
-                                         snap7.types.word(remote_tsap))
+        return self._library.Par_StartTo(self._pointer, local_ip.encode("ascii"), remote_ip.encode("ascii"),
+                                         local_tsap, remote_tsap)
 
     def stop(self) -> int:
         """
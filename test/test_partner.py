@@ -1,5 +1,7 @@
+import array
 import logging
 import unittest as unittest
+import weakref
 from unittest import mock
 
 import snap7.partner
@@ -18,14 +20,24 @@ class TestPartner(unittest.TestCase):
         self.partner.destroy()
 
     def test_as_b_send(self):
-        self.partner.as_b_send()
+        # the partner isn't linked to a remote partner
+        self.assertRaises(Snap7Exception, self.partner.as_b_send, bytearray(b"snap7"))
+
+    def test_as_b_send_too_large(self):
+        data = bytearray(snap7.types.buffer_size)
+        self.assertRaises(ValueError, self.partner.as_b_send, data)
 
     @unittest.skip("we don't recv something yet")
     def test_b_recv(self):
         self.partner.b_recv()
 
+    @unittest.skip("we don't recv something yet")
+    def test_b_recv_into(self):
+        self.partner.b_recv_into(bytearray(snap7.types.buffer_size))
+
     def test_b_send(self):
-        self.partner.b_send()
+        # the partner isn't linked to a remote partner
+        self.assertRaises(Snap7Exception, self.partner.b_send, bytearray(b"snap7"))
 
     def test_check_as_b_recv_completion(self):
         self.partner.check_as_b_recv_completion()
@@ -36,9 +48,15 @@ class TestPartner(unittest.TestCase):
     def test_create(self):
         self.partner.create()
 
+    def test_poll_recv(self):
+        self.assertIsNone(self.partner.poll_recv(timeout=10))
+
     def test_destroy(self):
         self.partner.destroy()
 
+    def test_echo_once(self):
+        self.assertIsNone(self.partner.echo_once())
+
     def test_error_text(self):
         snap7.common.error_text(0, context="partner")
 
@@ -98,10 +116,10 @@ class TestPartner(unittest.TestCase):
                           snap7.types.RemotePort, 1)
 
     def test_set_recv_callback(self):
-        self.partner.set_recv_callback()
+        self.partner.set_recv_callback(lambda op_result, r_id, data: None)
 
     def test_set_send_callback(self):
-        self.partner.set_send_callback()
+        self.partner.set_send_callback(lambda op_result: None)
 
     def test_start(self):
         self.partner.start()
@@ -109,6 +127,10 @@ class TestPartner(unittest.TestCase):
     def test_start_to(self):
         self.partner.start_to('0.0.0.0', '0.0.0.0', 0, 0)
 
+    def test_start_to_invalid_ip(self):
+        self.assertRaises(ValueError, self.partner.start_to, '0.0.0.256', '0.0.0.0', 0, 0)
+        self.assertRaises(ValueError, self.partner.start_to, '0.0.0.0', 'localhost', 0, 0)
+
     def test_stop(self):
         self.partner.stop()
 
@@ -137,11 +159,159 @@ class TestLibraryIntegration(unittest.TestCase):
         partner = snap7.partner.Partner()
         self.mocklib.Par_Create.assert_called_once()
 
+    def test_poll_recv(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_CheckAsBRecvCompletion.side_effect = [1, 1, 0]
+        self.assertEqual(partner.poll_recv(), (0, bytearray()))
+        self.assertEqual(self.mocklib.Par_CheckAsBRecvCompletion.call_count, 3)
+
+    def test_poll_recv_backoff(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_CheckAsBRecvCompletion.side_effect = [1] * 2001 + [0]
+        with mock.patch('snap7.partner._sched_yield') as sched_yield, mock.patch('time.sleep') as sleep:
+            self.assertEqual(partner.poll_recv(), (0, bytearray()))
+        self.assertEqual(sched_yield.call_count, 1000)
+        sleep.assert_called_once_with(0.001)
+
+    def test_check_as_b_recv_completion_no_copy(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_CheckAsBRecvCompletion.return_value = 0
+        r_id, data = partner.check_as_b_recv_completion(copy=False)
+        self.assertIsInstance(data, memoryview)
+
+    def test_check_as_b_recv_completion_pending(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_CheckAsBRecvCompletion.return_value = 1
+        self.assertIsNone(partner.check_as_b_recv_completion())
+
+    def test_check_as_b_recv_completion_invalid_handle(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_CheckAsBRecvCompletion.return_value = -2
+        self.assertRaises(Snap7Exception, partner.check_as_b_recv_completion)
+
+    def test_echo_once(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_CheckAsBSendCompletion.return_value = 0
+        self.mocklib.Par_CheckAsBRecvCompletion.return_value = 1
+        self.assertIsNone(partner.echo_once())
+        self.mocklib.Par_AsBSend.assert_not_called()
+        self.mocklib.Par_CheckAsBRecvCompletion.return_value = 0
+        self.mocklib.Par_AsBSend.return_value = 0
+        self.assertEqual(partner.echo_once(), (0, 0))
+        self.mocklib.Par_AsBSend.assert_called_once()
+
+    def test_echo_once_send_pending(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_CheckAsBSendCompletion.return_value = 1
+        self.mocklib.Par_CheckAsBRecvCompletion.return_value = 0
+        self.assertIsNone(partner.echo_once())
+        self.mocklib.Par_CheckAsBRecvCompletion.assert_not_called()
+        self.mocklib.Par_AsBSend.assert_not_called()
+
+    def test_echo_once_busy(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_CheckAsBSendCompletion.return_value = 0
+        self.mocklib.Par_CheckAsBRecvCompletion.return_value = 0
+        self.mocklib.Par_AsBSend.return_value = 0x00700000
+        with mock.patch('snap7.partner.check_error', side_effect=Snap7Exception("Partner Busy")) as check_error:
+            self.assertRaises(Snap7Exception, partner.echo_once)
+        check_error.assert_called_once_with(0x00700000, context="partner")
+
+    def test_echo_once_invalid_handle(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_CheckAsBSendCompletion.return_value = 0
+        self.mocklib.Par_CheckAsBRecvCompletion.return_value = -2
+        self.assertRaises(Snap7Exception, partner.echo_once)
+        self.mocklib.Par_AsBSend.assert_not_called()
+
+    def test_poll_recv_timeout(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_CheckAsBRecvCompletion.return_value = 1
+        self.assertIsNone(partner.poll_recv(timeout=10))
+
+    def test_as_b_send(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_AsBSend.return_value = 0
+        for data in (bytearray(b"snap7"), b"snap7", memoryview(b"snap7")):
+            partner.as_b_send(data, 1)
+            args = self.mocklib.Par_AsBSend.call_args[0]
+            self.assertEqual(args[1], 1)
+            self.assertEqual(bytes(args[2])[:5], b"snap7")
+            self.assertEqual(args[3], 5)
+
+    def test_as_b_send_memoryview(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_AsBSend.return_value = 0
+        words = array.array("H", [1, 2, 3, 4])
+        for data, expected in ((memoryview(words), words.tobytes()),
+                               (memoryview(words)[::2], array.array("H", [1, 3]).tobytes())):
+            partner.as_b_send(data)
+            args = self.mocklib.Par_AsBSend.call_args[0]
+            self.assertEqual(args[3], len(expected))
+            self.assertEqual(bytes(args[2])[:len(expected)], expected)
+
+    def test_b_recv_into(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_BRecv.return_value = 0
+        self.assertEqual(partner.b_recv_into(bytearray(snap7.types.buffer_size)), (0, 0))
+        self.assertRaises(ValueError, partner.b_recv_into, bytearray(10))
+
+    def test_recv_callback(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_SetRecvCallback.return_value = 0
+        received = []
+        partner.set_recv_callback(lambda op_result, r_id, data: received.append((op_result, r_id, data)))
+        data = b"snap7"
+        partner._recv_callback(None, 0, 1, data, len(data))
+        partner._recv_callback(None, 1, 1, data, len(data))
+        self.assertEqual(received, [(0, 1, b"snap7"), (1, 1, None)])
+
+    def test_recv_callback_zero_copy(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_SetRecvCallback.return_value = 0
+        received = []
+        partner.set_recv_callback(lambda op_result, r_id, data: received.append(bytes(data)), zero_copy=True)
+        data = b"snap7"
+        partner._recv_callback(None, 0, 1, data, len(data))
+        partner._recv_callback(None, 0, 1, None, 0)
+        self.assertEqual(received, [b"snap7", b""])
+
+    def test_error_wrap(self):
+        partner = snap7.partner.Partner()
+        self.mocklib.Par_Start.return_value = 0
+        with mock.patch('snap7.partner.check_error') as check_error:
+            self.assertEqual(partner.start(), 0)
+            check_error.assert_not_called()
+
+    def test_prototypes(self):
+        snap7.partner.Partner()
+        self.assertEqual(self.mocklib.Par_Create.restype, snap7.types.S7Object)
+        self.assertEqual(len(self.mocklib.Par_AsBSend.argtypes), 4)
+        self.assertEqual(len(self.mocklib.Par_BRecv.argtypes), 5)
+
+    def test_slots(self):
+        partner = snap7.partner.Partner()
+        self.assertFalse(hasattr(partner, "__dict__"))
+        self.assertIs(weakref.ref(partner)(), partner)
+
     def test_gc(self):
         partner = snap7.partner.Partner()
         del partner
         self.mocklib.Par_Destroy.assert_called_once()
 
+    def test_destroy_uninitialized(self):
+        self.loadlib_func.side_effect = Snap7Exception("can't find snap7 library")
+        self.assertRaises(Snap7Exception, snap7.partner.Partner)
+        partner = snap7.partner.Partner.__new__(snap7.partner.Partner)
+        self.assertIsNone(partner.destroy())
+
+    def test_destroy_twice(self):
+        partner = snap7.partner.Partner()
+        partner.destroy()
+        self.assertIsNone(partner.destroy())
+        del partner
+        self.mocklib.Par_Destroy.assert_called_once()
+
 
 if __name__ == '__main__':
     unittest.main()